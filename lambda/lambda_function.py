@@ -6,18 +6,81 @@ Main orchestration module that coordinates all components.
 
 import os
 import json
+import time
 import boto3
 import logging
+from concurrent.futures import Future
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 
 # Import our custom modules
 from utils import USPSAuthenticator, MailImageExtractor, S3Uploader, NovaActConfig
+from utils.s3_uploader import CLIENT_CONFIG, get_s3_client
+from utils._time import today_str
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Resolve STS through the regional endpoint rather than the global one
+os.environ.setdefault('AWS_STS_REGIONAL_ENDPOINTS', 'regional')
+
+# Longest slice of the serialized event written to the log
+MAX_EVENT_LOG_CHARS = 2048
+
+# Refresh cached credentials after this many seconds
+CREDENTIALS_TTL_SECONDS = 600
+
+# AWS clients and credentials kept at module scope so warm invocations
+# reuse pooled HTTPS connections and skip the Secrets Manager round-trip
+_S3_CLIENT = None
+_SECRETS_CLIENT = None
+_CREDENTIALS: Optional[Tuple[str, str]] = None
+_CREDENTIALS_FETCHED_AT = 0.0
+
+
+def _get_clients(aws_region: str) -> Tuple[Any, Any]:
+    """Return the shared S3 and Secrets Manager clients, creating them once."""
+    global _S3_CLIENT, _SECRETS_CLIENT
+    if _S3_CLIENT is None:
+        _S3_CLIENT = get_s3_client(aws_region)
+        _SECRETS_CLIENT = boto3.client('secretsmanager', region_name=aws_region, config=CLIENT_CONFIG)
+    return _S3_CLIENT, _SECRETS_CLIENT
+
+
+def _load_credentials(secrets_client: Any, secret_name: str) -> Tuple[str, str]:
+    """Retrieve USPS credentials from AWS Secrets Manager, cached for a short TTL."""
+    global _CREDENTIALS, _CREDENTIALS_FETCHED_AT
+    if _CREDENTIALS and time.monotonic() - _CREDENTIALS_FETCHED_AT < CREDENTIALS_TTL_SECONDS:
+        return _CREDENTIALS
+    
+    try:
+        response = secrets_client.get_secret_value(SecretId=secret_name)
+        secret_data = json.loads(response['SecretString'])
+        _CREDENTIALS = (secret_data['username'], secret_data['password'])
+        _CREDENTIALS_FETCHED_AT = time.monotonic()
+        return _CREDENTIALS
+    except Exception as e:
+        logger.error(f"Failed to retrieve credentials: {e}")
+        raise
+
+
+def _warm_up() -> None:
+    """Create AWS clients and prefetch credentials during the Lambda init phase."""
+    _, secrets_client = _get_clients(os.environ.get('AWS_REGION', 'us-east-1'))
+    
+    secret_name = os.environ.get('SECRET_NAME')
+    if secret_name:
+        try:
+            _load_credentials(secrets_client, secret_name)
+        except Exception as e:
+            logger.warning(f"Credential prefetch failed, retrying on invocation: {e}")
+
+
+# Do the one-time setup at import so it runs in the init phase, not per invocation
+if os.environ.get('AWS_LAMBDA_FUNCTION_NAME'):
+    _warm_up()
+
 
 class LambdaUSPSAutomator:
     """Main Lambda automation orchestrator."""
@@ -26,16 +89,16 @@ class LambdaUSPSAutomator:
         self.s3_bucket = s3_bucket
         self.secret_name = secret_name
         self.aws_region = aws_region
-        self.today = datetime.now().strftime("%Y-%m-%d")
+        self.today = today_str()
         
-        # Initialize AWS clients
-        self.secrets_client = boto3.client('secretsmanager', region_name=aws_region)
+        # Reuse AWS clients across warm invocations
+        self.s3_client, self.secrets_client = _get_clients(aws_region)
         
-        # Get credentials from Secrets Manager
+        # Get credentials from Secrets Manager (cached between invocations)
         self.username, self.password = self._get_credentials()
         
         # Initialize components
-        self.s3_uploader = S3Uploader(s3_bucket, aws_region)
+        self.s3_uploader = S3Uploader(s3_bucket, aws_region, s3_client=self.s3_client)
         self.nova_act_config = NovaActConfig("/tmp/nova_act_logs")
         
         # Will be initialized later
@@ -44,17 +107,11 @@ class LambdaUSPSAutomator:
     
     def _get_credentials(self) -> tuple[str, str]:
         """Retrieve USPS credentials from AWS Secrets Manager."""
-        try:
-            response = self.secrets_client.get_secret_value(SecretId=self.secret_name)
-            secret_data = json.loads(response['SecretString'])
-            return secret_data['username'], secret_data['password']
-        except Exception as e:
-            logger.error(f"Failed to retrieve credentials: {e}")
-            raise
+        return _load_credentials(self.secrets_client, self.secret_name)
     
-    def _upload_callback(self, file_data: bytes, filename: str) -> bool:
-        """Callback function for image uploads."""
-        return self.s3_uploader.upload_file(file_data, filename)
+    def _upload_callback(self, file_data: bytes, filename: str, content_type: str = 'image/png') -> Future:
+        """Callback function for image uploads; runs in the background."""
+        return self.s3_uploader.upload_file_async(file_data, filename, content_type)
     
     def run(self) -> Dict[str, Any]:
         """Run the automation and return results."""
@@ -85,10 +142,8 @@ class LambdaUSPSAutomator:
                 if self.authenticator.find_informed_delivery():
                     logger.info("Found Informed Delivery, checking for mail...")
                     
-                    # Extract images and fix S3 paths
-                    raw_files = self.image_extractor.check_mail_images()
-                    uploaded_files = [f.replace("s3://bucket/", f"s3://{self.s3_bucket}/") for f in raw_files if f]
-                    
+                    # Extract images; their uploads finish in the background
+                    self.image_extractor.check_mail_images()
                     success = True
                 else:
                     error_message = "Could not access Informed Delivery"
@@ -102,16 +157,26 @@ class LambdaUSPSAutomator:
             logger.error(f"Nova Act automation failed: {e}")
         
         finally:
-            # Stop Nova Act session
+            # Stop Nova Act session (kept alive for reuse unless the run failed)
             if nova_act:
-                self.nova_act_config.stop()
+                self.nova_act_config.stop(discard=error_message is not None)
+            
+            # Collect image uploads that overlapped with browser shutdown and fix S3 paths
+            if self.image_extractor:
+                raw_files = self.image_extractor.wait_for_uploads()
+                uploaded_files = [f.replace("s3://bucket/", f"s3://{self.s3_bucket}/") for f in raw_files if f]
+            self.s3_uploader.close()
             
             # Upload logs to S3 (if enabled)
             upload_logs = os.environ.get('UPLOAD_LOGS_TO_S3', 'true').lower() == 'true'
             if upload_logs:
                 try:
                     logger.info("Uploading Nova Act logs to S3...")
-                    uploaded_logs = self.s3_uploader.upload_logs(self.nova_act_config.logs_dir)
+                    # Only this invocation's files: with REUSE_BROWSER the logs directory
+                    # keeps growing with earlier invocations of the shared session
+                    uploaded_logs = self.s3_uploader.upload_logs(
+                        self.nova_act_config.logs_dir, modified_since=start_time.timestamp()
+                    )
                 except Exception as e:
                     logger.error(f"Failed to upload logs: {e}")
             else:
@@ -135,7 +200,8 @@ class LambdaUSPSAutomator:
 
 def lambda_handler(event, context):
     """AWS Lambda handler function."""
-    logger.info(f"Lambda function started. Event: {json.dumps(event)}")
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Lambda function started. Event: %s", json.dumps(event)[:MAX_EVENT_LOG_CHARS])
     
     # Get environment variables
     s3_bucket = os.environ.get('S3_BUCKET_NAME')
@@ -158,14 +224,15 @@ def lambda_handler(event, context):
         automator = LambdaUSPSAutomator(s3_bucket, secret_name, aws_region)
         result = automator.run()
         
-        # Log results
-        logger.info(f"Automation completed: {json.dumps(result)}")
+        # Serialize once for both the log line and the response body
+        body = json.dumps(result)
+        logger.info("Automation completed: %s", body)
         
         # Return response
         status_code = 200 if result['success'] else 500
         return {
             'statusCode': status_code,
-            'body': json.dumps(result)
+            'body': body
         }
         
     except Exception as e:
@@ -0,0 +1,19 @@
+"""
+Shared date helpers.
+Keeps date formatting out of every per-invocation constructor.
+"""
+
+from datetime import date
+from functools import lru_cache
+
+
+def today_str() -> str:
+    """Return today's local date as YYYY-MM-DD."""
+    # Keying the cache on the local date keeps warm containers correct across midnight
+    return _format_date(date.today())
+
+
+@lru_cache(maxsize=1)
+def _format_date(day: date) -> str:
+    """Format the given date once and reuse it for the rest of the day."""
+    return day.strftime("%Y-%m-%d")
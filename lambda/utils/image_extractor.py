@@ -3,54 +3,205 @@ Image extraction and processing module.
 Handles finding, analyzing, and capturing mail images.
 """
 
+import io
+import os
+import hashlib
+import re
 import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Callable
-from nova_act import NovaAct
+from typing import TYPE_CHECKING, Any, List, Callable, Dict, Optional, Tuple
+from ._time import today_str
+
+if TYPE_CHECKING:
+    from nova_act import NovaAct
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; fall back to per-element screenshots
+    Image = None
 
 logger = logging.getLogger(__name__)
 
+# Encoding for captured mail images; JPEG is several times smaller than PNG
+# for scanned mail pieces. The full page fallback always stays PNG.
+DEFAULT_IMAGE_FORMAT = 'jpeg'
+DEFAULT_IMAGE_QUALITY = 85
+SUPPORTED_IMAGE_FORMATS = {'jpeg', 'png'}
+
+
+def _read_image_format() -> str:
+    """Read IMG_FORMAT, falling back to the default for unsupported values."""
+    image_format = os.environ.get('IMG_FORMAT', DEFAULT_IMAGE_FORMAT).strip().lower()
+    if image_format == 'jpg':
+        image_format = 'jpeg'
+    if image_format not in SUPPORTED_IMAGE_FORMATS:
+        logger.warning(f"Unsupported IMG_FORMAT {image_format!r}, using {DEFAULT_IMAGE_FORMAT}")
+        return DEFAULT_IMAGE_FORMAT
+    return image_format
+
+
+def _read_image_quality() -> int:
+    """Read IMG_QUALITY, falling back to the default for invalid values."""
+    raw_quality = os.environ.get('IMG_QUALITY', str(DEFAULT_IMAGE_QUALITY))
+    try:
+        quality = int(raw_quality)
+    except ValueError:
+        quality = None
+    if quality is None or not 1 <= quality <= 100:
+        logger.warning(f"Invalid IMG_QUALITY {raw_quality!r}, using {DEFAULT_IMAGE_QUALITY}")
+        return DEFAULT_IMAGE_QUALITY
+    return quality
+
+
+IMAGE_FORMAT = _read_image_format()
+IMAGE_QUALITY = _read_image_quality()
+IMAGE_EXTENSION = 'jpg' if IMAGE_FORMAT == 'jpeg' else 'png'
+IMAGE_CONTENT_TYPE = f"image/{IMAGE_FORMAT}"
+
+# Pillow releases the GIL while encoding, so crops encode in parallel
+ENCODE_WORKERS = 4
+
+# Browser-side helpers so attributes and geometry for all images come back in one call
+IMAGE_ATTRIBUTES_JS = (
+    "els => els.map(e => ({src: e.getAttribute('src') || '', alt: e.getAttribute('alt') || ''}))"
+)
+IMAGE_BOXES_JS = """els => els.map(e => {
+    const r = e.getBoundingClientRect();
+    return {x: r.x + window.scrollX, y: r.y + window.scrollY, width: r.width, height: r.height};
+})"""
+IMAGES_LOADED_JS = "els => els.every(e => e.complete && e.naturalHeight > 0)"
+TAG_IMAGES_JS = "els => els.forEach((e, i) => e.setAttribute('data-mail-idx', i))"
+
+# Substrings in an image's src or alt that mark it as page chrome rather than mail
+UI_ELEMENT_PATTERN = re.compile(r'logo|banner|icon|button|nav', re.IGNORECASE)
+
+# Structured responses for the mail check and the batched address classification
+BOOLEAN_SCHEMA = {'type': 'boolean'}
+ADDRESS_INDICES_SCHEMA = {'type': 'array', 'items': {'type': 'integer'}}
+
+# Screenshot retries back off from this delay, doubling on each attempt
+RETRY_BASE_DELAY_MS = 250
+
+
+def _is_retryable(error: Exception) -> bool:
+    """A detached element or closed page/browser will not recover on retry."""
+    message = str(error).lower()
+    return 'detached' not in message and 'closed' not in message
+
+
+def _is_blank(image: 'Image.Image') -> bool:
+    """Check whether every pixel has the same value, e.g. an image that has not loaded."""
+    extrema = image.getextrema()
+    if isinstance(extrema[0], tuple):
+        return all(low == high for low, high in extrema)
+    return extrema[0] == extrema[1]
+
+
+def _content_digest(image: 'Image.Image') -> Tuple[str, Tuple[int, int], bytes]:
+    """Key on the exact pixels, so only identical crops (one scan served from two URLs) match.
+    
+    Perceptual hashes are not used: same-layout envelopes with different
+    address text often hash identically.
+    """
+    return image.mode, image.size, hashlib.blake2b(image.tobytes()).digest()
+
+
+@dataclass
+class MailImage:
+    """A candidate mail image with the attributes read when it was found."""
+    handle: Any
+    src: str
+    alt: str
+    crop: Optional['Image.Image'] = None
+
 
 class MailImageExtractor:
     """Handles extraction and processing of mail images."""
     
-    def __init__(self, nova_act: NovaAct, upload_callback: Callable[[bytes, str], bool]):
+    # Nova Act prompts
+    MAIL_CHECK_PROMPT = (
+        "I am now in my Informed Delivery section. Look for today's mail images. "
+        "Answer whether any mail piece images are shown for today."
+    )
+    CLASSIFY_PROMPT = (
+        "Examine every mail image on the page that has a data-mail-idx attribute. "
+        "Look for addressing information such as: "
+        "- Recipient name and address "
+        "- Street address, city, state, zip code "
+        "- Return address information "
+        "- Any text that looks like mailing labels "
+        "Return the data-mail-idx values of the images where you can clearly see "
+        "addressing information. Leave out images that are blank, just a logo, "
+        "or contain no addressing text."
+    )
+    
+    def __init__(self, nova_act: 'NovaAct', upload_callback: Callable[[bytes, str, str], Future]):
         self.nova_act = nova_act
         self.upload_callback = upload_callback
-        self.today = datetime.now().strftime("%Y-%m-%d")
+        # S3 path -> in-flight upload, resolved by wait_for_uploads()
+        self.pending_uploads: Dict[str, Future] = {}
+        self.today = today_str()
     
     def check_mail_images(self) -> List[str]:
-        """Check for today's mail images and process them."""
+        """Check for today's mail images and queue their uploads.
+        
+        Uploads run in the background; call wait_for_uploads() for the files
+        that actually reached S3.
+        """
         uploaded_files = []
+        # One timestamp per run; the image number keeps filenames unique
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         
         try:
             # Check what's available
-            mail_check = self.nova_act.act(
-                "I am now in my Informed Delivery section. Look for today's mail images "
-            )
-            logger.info(f"Mail check: {mail_check}")
+            mail_check = self.nova_act.act_get(self.MAIL_CHECK_PROMPT, schema=BOOLEAN_SCHEMA)
+            logger.info(f"Mail check: {mail_check.response}")
             
-            # Find and analyze images
-            all_images = self._find_and_analyze_images()
+            # Skip the image search entirely on days with no mail
+            if mail_check.matches_schema and mail_check.parsed_response is False:
+                logger.info("No mail images today")
+                fallback_file = self._take_fallback_screenshot(timestamp)
+                return [fallback_file] if fallback_file else []
             
-            # Remove duplicates
-            unique_images = self._remove_duplicate_images(all_images)
-            logger.info(f"Found {len(unique_images)} unique mail images")
+            # Find, de-duplicate and analyze images
+            mail_images = self._find_and_analyze_images()
+            logger.info(f"Found {len(mail_images)} unique mail images")
             
-            # Process each image
-            for i, img in enumerate(unique_images):
+            # Capture images that have no crop serially, since Playwright
+            # handles must stay on this thread
+            captures = []
+            crops = []
+            for i, image in enumerate(mail_images):
+                image_num = i + 1
+                if image.crop is not None:
+                    crops.append((image.crop, f"mail_image_{image_num}_{timestamp}.{IMAGE_EXTENSION}"))
+                    continue
                 try:
-                    uploaded_file = self._process_single_image(img, i + 1)
-                    if uploaded_file:
-                        uploaded_files.append(uploaded_file)
+                    capture = self._process_single_image(image, image_num, timestamp)
+                    if capture:
+                        captures.append(capture)
                         
                 except Exception as e:
-                    logger.warning(f"Failed to process image {i+1}: {e}")
+                    logger.warning(f"Failed to process image {image_num}: {e}")
                     continue
             
+            # Crops are plain Pillow images, so encode them in parallel
+            if crops:
+                with ThreadPoolExecutor(max_workers=min(ENCODE_WORKERS, len(crops))) as executor:
+                    encoded = executor.map(lambda item: self._encode_crop(item[0]), crops)
+                    captures.extend(zip(encoded, (filename for _, filename in crops)))
+            
+            # Queue the captured screenshots for background upload
+            uploaded_files = [
+                self._queue_upload(screenshot_bytes, filename, IMAGE_CONTENT_TYPE)
+                for screenshot_bytes, filename in captures
+            ]
+            
             # Fallback: full page screenshot if no images found
             if not uploaded_files:
-                fallback_file = self._take_fallback_screenshot()
+                fallback_file = self._take_fallback_screenshot(timestamp)
                 if fallback_file:
                     uploaded_files.append(fallback_file)
             
@@ -59,122 +210,198 @@ class MailImageExtractor:
         
         return uploaded_files
     
-    def _find_and_analyze_images(self) -> List:
-        """Find and analyze images for address content."""
+    def _find_and_analyze_images(self) -> List[MailImage]:
+        """Find candidate images, drop duplicates, and keep those with address content."""
+        # A single combined selector lets the browser union the matches in one round-trip
         selectors = [
-            'img[alt*="Mail Piece Images"]',
-            'img[alt*="mail"]',
-            'img[src*="mail"]'
+            'img[alt*="Mail Piece Images" i]',
+            'img[alt*="mail" i]',
+            'img[src*="mail" i]'
         ]
+        combined_selector = ', '.join(selectors)
+        
+        page = self.nova_act.page
+        images = page.query_selector_all(combined_selector)
+        logger.info(f"Found {len(images)} potential images with selector: {combined_selector}")
+        
+        # Read src/alt for every image in a single round-trip, from the handles
+        # already held so each attribute set stays paired with its element
+        attributes = page.evaluate(IMAGE_ATTRIBUTES_JS, images)
+        
+        # Skip images whose source or alt text suggests a UI element
+        candidates = []
+        for i, (img, attrs) in enumerate(zip(images, attributes)):
+            image = MailImage(handle=img, src=attrs['src'], alt=attrs['alt'])
+            if self._is_ui_element(image):
+                logger.info(f"✗ Skipping image {i+1} - appears to be UI element: {image.src}")
+                continue
+            candidates.append(image)
+        
+        # Crop every candidate out of one page screenshot, for de-duplication and upload
+        self._crop_images_from_page(candidates)
+        
+        # De-duplicate by content before paying for any Nova Act analysis
+        unique_images = []
+        seen_digests = set()
+        seen_srcs = set()
+        for i, image in enumerate(candidates):
+            if self._is_duplicate(image, seen_digests, seen_srcs):
+                logger.info(f"✗ Skipping image {i+1} - duplicate of an earlier image: {image.src}")
+                continue
+            unique_images.append(image)
+        
+        if not unique_images:
+            return []
+        
+        try:
+            address_indices = self._classify_images([image.handle for image in unique_images])
+        except Exception as e:
+            # Fail closed; check_mail_images falls back to one full page screenshot
+            logger.warning(f"Failed to analyze images, skipping all {len(unique_images)}: {e}")
+            return []
         
         all_images = []
-        for selector in selectors:
-            images = self.nova_act.page.query_selector_all(selector)
-            logger.info(f"Found {len(images)} potential images with selector: {selector}")
-            
-            # Check each image for address content using Nova Act
-            for i, img in enumerate(images):
-                try:
-                    if self._should_include_image(img, i + 1):
-                        all_images.append(img)
-                        
-                except Exception as e:
-                    logger.warning(f"Failed to analyze image {i+1}: {e}")
-                    # If analysis fails, include the image to be safe
-                    all_images.append(img)
-                    logger.info(f"⚠ Including image {i+1} due to analysis failure")
-                    continue
+        for i, image in enumerate(unique_images):
+            if i in address_indices:
+                logger.info(f"✓ Image {i+1} contains address information")
+                all_images.append(image)
+            else:
+                logger.info(f"✗ Image {i+1} filtered out - no address information")
         
         return all_images
     
-    def _should_include_image(self, img, image_num: int) -> bool:
-        """Determine if an image should be included based on content analysis."""
-        # First, check if the image source or alt text suggests it's a mail piece
-        src = img.get_attribute('src') or ''
-        alt = img.get_attribute('alt') or ''
-        
-        # Skip obvious non-mail images
-        skip_keywords = ['logo', 'banner', 'icon', 'button', 'nav']
-        if any(keyword in src.lower() or keyword in alt.lower() for keyword in skip_keywords):
-            logger.info(f"✗ Skipping image {image_num} - appears to be UI element: {src}")
-            return False
-        
-        # Use Nova Act to analyze the image content for address information
-        analysis_result = self.nova_act.act(
-            f"Examine this mail image carefully. Look for addressing information such as: "
-            f"- Recipient name and address "
-            f"- Street address, city, state, zip code "
-            f"- Return address information "
-            f"- Any text that looks like mailing labels "
-            f"Respond with 'HAS_ADDRESS' if you can clearly see addressing information, "
-            f"or 'NO_ADDRESS' if it's blank, just a logo, or contains no addressing text.",
-            element=img
-        )
-        
-        # Check if Nova Act found address information
-        analysis_text = str(analysis_result).upper()
-        has_address = ('HAS_ADDRESS' in analysis_text or 
-                      any(keyword in analysis_text for keyword in ['ADDRESS', 'RECIPIENT', 'STREET', 'ZIP']))
-        
-        if has_address:
-            logger.info(f"✓ Image {image_num} contains address information: {analysis_result}")
+    @staticmethod
+    def _is_ui_element(image: MailImage) -> bool:
+        """Check whether the image source or alt text suggests a UI element."""
+        return bool(UI_ELEMENT_PATTERN.search(image.src) or UI_ELEMENT_PATTERN.search(image.alt))
+    
+    @staticmethod
+    def _is_duplicate(image: MailImage, seen_digests: set, seen_srcs: set) -> bool:
+        """Check an image against those already seen, by src or identical pixels."""
+        if image.src and image.src in seen_srcs:
             return True
-        else:
-            logger.info(f"✗ Image {image_num} filtered out - no address information: {analysis_result}")
-            return False
+        
+        # Blank crops (images still loading) all look alike, so only src can tell them apart
+        if image.crop is not None and not _is_blank(image.crop):
+            digest = _content_digest(image.crop)
+            if digest in seen_digests:
+                return True
+            seen_digests.add(digest)
+        elif not image.src:
+            return True
+        
+        if image.src:
+            seen_srcs.add(image.src)
+        return False
     
-    def _remove_duplicate_images(self, all_images: List) -> List:
-        """Remove duplicate images based on src attribute."""
-        unique_images = []
-        seen_srcs = set()
+    def _classify_images(self, images: List) -> set:
+        """Ask Nova Act once which of the images carry addressing information.
         
-        for img in all_images:
-            src = img.get_attribute('src')
-            if src and src not in seen_srcs:
-                unique_images.append(img)
-                seen_srcs.add(src)
+        Returns the positions (into images) of the address-bearing ones.
+        """
+        # Tag the images so the prompt can refer to them by index
+        self.nova_act.page.evaluate(TAG_IMAGES_JS, images)
         
-        return unique_images
+        result = self.nova_act.act_get(self.CLASSIFY_PROMPT, schema=ADDRESS_INDICES_SCHEMA)
+        
+        if not result.matches_schema:
+            raise ValueError(f"unexpected classification response: {result.response}")
+        logger.info(f"Images with address information: {result.parsed_response}")
+        return set(result.parsed_response)
     
-    def _process_single_image(self, img, image_num: int) -> str:
-        """Process a single image and return the uploaded file path."""
-        src = img.get_attribute('src')
-        if not src:
+    def _crop_images_from_page(self, images: List[MailImage]) -> None:
+        """Crop every image out of a single full-page screenshot.
+        
+        Images keep crop=None when Pillow is unavailable, the page capture
+        fails, or the image is not visible, so the caller can fall back to a
+        per-element screenshot.
+        """
+        if Image is None or not images:
+            return
+        
+        handles = [image.handle for image in images]
+        try:
+            self._wait_for_images_load(handles)
+            
+            # Page-relative geometry for every image in one round-trip
+            page = self.nova_act.page
+            boxes = page.evaluate(IMAGE_BOXES_JS, handles)
+            page_bytes = page.screenshot(full_page=True, scale='css', timeout=60000)
+            page_image = Image.open(io.BytesIO(page_bytes))
+            page_image.load()
+        except Exception as e:
+            logger.warning(f"Full page capture failed, falling back to per-image screenshots: {e}")
+            return
+        
+        for i, (image, box) in enumerate(zip(images, boxes)):
+            if not box['width'] or not box['height']:
+                logger.warning(f"Image {i+1} is not visible, cannot crop it")
+                continue
+            
+            left, top = box['x'], box['y']
+            image.crop = page_image.crop((
+                round(left), round(top),
+                round(left + box['width']), round(top + box['height'])
+            ))
+    
+    @staticmethod
+    def _encode_crop(crop: 'Image.Image') -> bytes:
+        """Encode a cropped image in the configured format."""
+        buffer = io.BytesIO()
+        if IMAGE_FORMAT == 'jpeg':
+            crop.convert('RGB').save(buffer, 'JPEG', quality=IMAGE_QUALITY, optimize=True)
+        else:
+            crop.save(buffer, 'PNG', optimize=True)
+        return buffer.getvalue()
+    
+    def _process_single_image(self, image: MailImage, image_num: int, timestamp: str) -> Optional[Tuple[bytes, str]]:
+        """Capture a single image and return its screenshot bytes and filename."""
+        if not image.src:
             return None
             
-        logger.info(f"Processing image {image_num}: {src}")
+        logger.info(f"Processing image {image_num}: {image.src}")
         
         # Wait for image to be fully loaded
-        self._wait_for_image_load(img, image_num)
+        self._wait_for_images_load([image.handle])
         
         # Take screenshot with retry logic
-        screenshot_bytes = self._take_image_screenshot(img, image_num)
+        screenshot_bytes = self._take_image_screenshot(image.handle, image_num)
         
         if screenshot_bytes:
-            # Generate filename and upload
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"mail_image_{image_num}_{timestamp}.png"
-            
-            if self.upload_callback(screenshot_bytes, filename):
-                return f"s3://bucket/{self.today}/{filename}"  # Will be updated by caller
+            # Generate filename
+            filename = f"mail_image_{image_num}_{timestamp}.{IMAGE_EXTENSION}"
+            return screenshot_bytes, filename
         else:
             logger.warning(f"No screenshot data for image {image_num}")
             
         return None
     
-    def _wait_for_image_load(self, img, image_num: int) -> None:
-        """Wait for image to be fully loaded before screenshot."""
+    def _queue_upload(self, file_data: bytes, filename: str, content_type: str) -> str:
+        """Start a background upload and return the file path it will be stored at."""
+        file_path = f"s3://bucket/{self.today}/{filename}"  # Will be updated by caller
+        self.pending_uploads[file_path] = self.upload_callback(file_data, filename, content_type)
+        return file_path
+    
+    def wait_for_uploads(self) -> List[str]:
+        """Block until queued uploads finish and return the paths that succeeded."""
+        uploaded_files = []
+        for file_path, future in self.pending_uploads.items():
+            try:
+                if future.result():
+                    uploaded_files.append(file_path)
+            except Exception as e:
+                logger.warning(f"Failed to upload {file_path}: {e}")
+        
+        self.pending_uploads.clear()
+        return uploaded_files
+    
+    def _wait_for_images_load(self, images: List) -> None:
+        """Wait for images to be fully loaded before screenshot."""
         try:
-            # Wait for the image element to be stable
-            self.nova_act.page.wait_for_timeout(2000)
-            
-            # Check if image is loaded
-            is_loaded = img.evaluate("img => img.complete && img.naturalHeight !== 0")
-            if not is_loaded:
-                logger.warning(f"Image {image_num} may not be fully loaded, waiting...")
-                self.nova_act.page.wait_for_timeout(3000)
+            # Polls inside the page and returns at once if everything is already loaded
+            self.nova_act.page.wait_for_function(IMAGES_LOADED_JS, arg=images, timeout=5000)
         except Exception as load_check_error:
-            logger.warning(f"Could not verify image load status: {load_check_error}")
+            logger.warning(f"Images may not be fully loaded: {load_check_error}")
     
     def _take_image_screenshot(self, img, image_num: int) -> bytes:
         """Take screenshot of image with retry logic."""
@@ -182,41 +409,38 @@ class MailImageExtractor:
         
         for attempt in range(max_retries):
             try:
-                # Increase timeout to 60 seconds and add retry logic
+                if IMAGE_FORMAT == 'jpeg':
+                    return img.screenshot(timeout=60000, type='jpeg', quality=IMAGE_QUALITY)
                 return img.screenshot(timeout=60000)
             except Exception as screenshot_error:
                 logger.warning(f"Screenshot attempt {attempt + 1} failed for image {image_num}: {screenshot_error}")
-                if attempt < max_retries - 1:
-                    # Wait a bit before retrying
-                    self.nova_act.page.wait_for_timeout(2000)
+                if attempt < max_retries - 1 and _is_retryable(screenshot_error):
+                    # Back off briefly before retrying
+                    self.nova_act.page.wait_for_timeout(RETRY_BASE_DELAY_MS * 2 ** attempt)
                 else:
                     logger.error(f"All screenshot attempts failed for image {image_num}")
                     raise screenshot_error
         
         return None
     
-    def _take_fallback_screenshot(self) -> str:
+    def _take_fallback_screenshot(self, timestamp: str) -> str:
         """Take full page screenshot as fallback."""
         logger.info("No images found, taking full page screenshot")
         
         try:
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             filename = f"mail_preview_full_{timestamp}.png"
             
-            # Full page screenshot with increased timeout and retry logic
+            # Full page screenshot with retry logic
             max_retries = 3
             
             for attempt in range(max_retries):
                 try:
-                    screenshot_bytes = self.nova_act.page.screenshot(full_page=True, timeout=90000)
-                    
-                    if self.upload_callback(screenshot_bytes, filename):
-                        return f"s3://bucket/{self.today}/{filename}"  # Will be updated by caller
-                    break
+                    screenshot_bytes = self.nova_act.page.screenshot(full_page=True, timeout=30000)
+                    return self._queue_upload(screenshot_bytes, filename, 'image/png')
                 except Exception as screenshot_error:
                     logger.warning(f"Full page screenshot attempt {attempt + 1} failed: {screenshot_error}")
-                    if attempt < max_retries - 1:
-                        self.nova_act.page.wait_for_timeout(3000)
+                    if attempt < max_retries - 1 and _is_retryable(screenshot_error):
+                        self.nova_act.page.wait_for_timeout(RETRY_BASE_DELAY_MS * 2 ** attempt)
                     else:
                         logger.error("All full page screenshot attempts failed")
                         raise screenshot_error
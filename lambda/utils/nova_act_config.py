@@ -4,41 +4,119 @@ Handles Nova Act setup for Lambda environment.
 """
 
 import os
-import glob
+import sys
+import atexit
+import signal
 import logging
-from typing import Optional
-from nova_act import NovaAct
+import traceback
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from nova_act import NovaAct
 
 logger = logging.getLogger(__name__)
 
+USPS_HOME_URL = "https://www.usps.com/"
+
+# Environment for the Microsoft Playwright image, set once at import
+os.environ['PLAYWRIGHT_BROWSERS_PATH'] = '/ms-playwright'
+os.environ['PLAYWRIGHT_SKIP_BROWSER_DOWNLOAD'] = '1'
+os.environ['NOVA_ACT_SKIP_PLAYWRIGHT_INSTALL'] = '1'
+
+# Keep the browser alive between warm invocations instead of relaunching Chromium
+REUSE_BROWSER = os.environ.get('REUSE_BROWSER', '0') == '1'
+
+
+def _find_chromium_executable() -> Optional[str]:
+    """Locate the Chromium binary shipped in the Microsoft Playwright image."""
+    try:
+        # One directory read; the full browser is preferred over headless_shell
+        with os.scandir('/ms-playwright') as entries:
+            chromium_dirs = sorted(
+                entry.path for entry in entries
+                if entry.name.startswith('chromium') and entry.is_dir()
+            )
+    except OSError:
+        return None
+    
+    for binary in ('chrome-linux/chrome', 'chrome-linux/headless_shell'):
+        for chromium_dir in chromium_dirs:
+            path = os.path.join(chromium_dir, binary)
+            if os.path.exists(path):
+                return path
+    return None
+
+
+# Resolved once per execution environment; CHROMIUM_PATH skips the directory scan
+CHROMIUM_EXECUTABLE = os.environ.get('CHROMIUM_PATH') or _find_chromium_executable()
+
+# Nova Act session shared across warm invocations when REUSE_BROWSER is enabled
+_NOVA: Optional['NovaAct'] = None
+
+
+def _shutdown_shared_session() -> None:
+    """Stop the shared Nova Act session, if any."""
+    global _NOVA
+    if _NOVA is not None:
+        try:
+            _NOVA.stop()
+            logger.info("Shared Nova Act session stopped")
+        except Exception as e:
+            logger.warning(f"Error stopping shared Nova Act session: {e}")
+        _NOVA = None
+
+
+def _handle_sigterm(signum, frame) -> None:
+    """Stop Chromium before the execution environment is shut down."""
+    _shutdown_shared_session()
+    sys.exit(0)
+
+
+if REUSE_BROWSER:
+    atexit.register(_shutdown_shared_session)
+    signal.signal(signal.SIGTERM, _handle_sigterm)
+
 
 class NovaActConfig:
     """Handles Nova Act configuration and initialization."""
     
+    # Environment diagnostics only need to run once per execution environment
+    _initialized = False
+    
     def __init__(self, logs_dir: str):
         self.logs_dir = logs_dir
-        self.nova_act: Optional[NovaAct] = None
+        self.nova_act: Optional['NovaAct'] = None
     
-    def initialize(self) -> NovaAct:
+    def initialize(self) -> 'NovaAct':
         """Initialize Nova Act for Lambda environment."""
+        global _NOVA
+        if REUSE_BROWSER and _NOVA is not None:
+            if self._is_alive(_NOVA):
+                logger.info("Reusing Nova Act browser from previous invocation")
+                self.nova_act = _NOVA
+                return self.nova_act
+            _shutdown_shared_session()
+        
         try:
             # Create logs directory
             os.makedirs(self.logs_dir, exist_ok=True)
             
-            # Set environment variables for Microsoft Playwright image
-            self._setup_playwright_environment()
-            
-            # Log environment info for debugging
-            self._log_environment_info()
-            
-            # Check for Chromium executable
-            self._check_chromium_executable()
+            if not NovaActConfig._initialized:
+                # Log environment info for debugging
+                self._log_environment_info()
+                
+                # Check for Chromium executable
+                self._check_chromium_executable()
+                NovaActConfig._initialized = True
             
             logger.info("Attempting Nova Act initialization with Microsoft Playwright image...")
             
+            # Deferred import: nova_act pulls in Playwright and is only needed here
+            from nova_act import NovaAct
+            
             # Initialize Nova Act with configuration
             self.nova_act = NovaAct(
-                starting_page="https://www.usps.com/",
+                starting_page=USPS_HOME_URL,
                 headless=True,  # Always headless in Lambda
                 logs_directory=self.logs_dir,
                 clone_user_data_dir=False,  # Don't clone user data in Lambda
@@ -47,53 +125,70 @@ class NovaActConfig:
                 chrome_channel="chromium"
             )
             
+            if REUSE_BROWSER:
+                _NOVA = self.nova_act
+            
             logger.info("Nova Act initialized successfully for Lambda")
             return self.nova_act
                 
         except Exception as e:
             logger.error(f"Failed to initialize Nova Act: {e}")
             logger.error(f"Error type: {type(e).__name__}")
-            import traceback
             logger.error(f"Full traceback: {traceback.format_exc()}")
             raise
     
-    def _setup_playwright_environment(self) -> None:
-        """Set up Playwright environment variables."""
-        os.environ['PLAYWRIGHT_BROWSERS_PATH'] = '/ms-playwright'
-        os.environ['PLAYWRIGHT_SKIP_BROWSER_DOWNLOAD'] = '1'
-        os.environ['NOVA_ACT_SKIP_PLAYWRIGHT_INSTALL'] = '1'
-    
     def _log_environment_info(self) -> None:
         """Log environment information for debugging."""
-        logger.info(f"Python version: {os.sys.version}")
-        logger.info(f"PLAYWRIGHT_BROWSERS_PATH: {os.environ.get('PLAYWRIGHT_BROWSERS_PATH')}")
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        
+        logger.debug(f"Python version: {sys.version}")
+        logger.debug(f"PLAYWRIGHT_BROWSERS_PATH: {os.environ.get('PLAYWRIGHT_BROWSERS_PATH')}")
         
         playwright_dir = '/ms-playwright'
         if os.path.exists(playwright_dir):
-            logger.info(f"Available files in /ms-playwright: {os.listdir(playwright_dir)}")
+            logger.debug(f"Available files in /ms-playwright: {os.listdir(playwright_dir)}")
         else:
-            logger.info("Directory /ms-playwright not found")
+            logger.debug("Directory /ms-playwright not found")
     
     def _check_chromium_executable(self) -> None:
         """Check for Chromium executable availability."""
-        chromium_paths = [
-            '/ms-playwright/chromium-*/chrome-linux/chrome',
-            '/ms-playwright/chromium-*/chrome-linux/headless_shell',
-            '/ms-playwright/chromium*/chrome-linux/chrome',
-            '/ms-playwright/chromium*/chrome-linux/headless_shell'
-        ]
-        
-        for pattern in chromium_paths:
-            matches = glob.glob(pattern)
-            if matches:
-                logger.info(f"Found Chromium executable(s): {matches}")
+        if CHROMIUM_EXECUTABLE:
+            logger.debug(f"Found Chromium executable: {CHROMIUM_EXECUTABLE}")
+        else:
+            logger.warning("No Chromium executable found in expected locations")
+    
+    @staticmethod
+    def _is_alive(nova_act: 'NovaAct') -> bool:
+        """Check whether a previously started browser session is still usable."""
+        try:
+            return nova_act.page.context is not None and not nova_act.page.is_closed()
+        except Exception:
+            return False
+    
+    def _reset_session(self) -> None:
+        """Clear cookies and storage so the next invocation starts clean."""
+        page = self.nova_act.page
+        try:
+            page.evaluate("() => { localStorage.clear(); sessionStorage.clear(); }")
+        except Exception as e:
+            logger.debug(f"Could not clear web storage: {e}")
+        page.context.clear_cookies()
+        page.goto("about:blank")
+    
+    def stop(self, discard: bool = False) -> None:
+        """Stop Nova Act session safely, or keep the browser for reuse."""
+        if self.nova_act and REUSE_BROWSER and self.nova_act is _NOVA and not discard:
+            try:
+                self._reset_session()
+                logger.info("Nova Act browser kept alive for reuse")
                 return
+            except Exception as e:
+                logger.warning(f"Error resetting Nova Act session, stopping instead: {e}")
         
-        logger.warning("No Chromium executable found in expected locations")
-    
-    def stop(self) -> None:
-        """Stop Nova Act session safely."""
-        if self.nova_act:
+        if self.nova_act is not None and self.nova_act is _NOVA:
+            _shutdown_shared_session()
+        elif self.nova_act:
             try:
                 self.nova_act.stop()
                 logger.info("Nova Act session stopped")
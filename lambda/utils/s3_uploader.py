@@ -3,101 +3,193 @@ S3 upload and log management module.
 Handles file uploads to S3 and log processing.
 """
 
+import io
 import os
+import gzip
 import logging
+import mimetypes
+import tarfile
+import tempfile
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import List
+from typing import Iterator, List, Optional, Any, Dict, Tuple
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from ._time import today_str
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on concurrent log file uploads
+MAX_UPLOAD_WORKERS = 16
+
+# Background workers for image uploads queued while the browser is still busy
+IMAGE_UPLOAD_WORKERS = 8
+
+# Upload logs as one gzipped tarball; set LOGS_AS_TARBALL=0 for one object per file
+LOGS_AS_TARBALL = os.environ.get('LOGS_AS_TARBALL', '1') != '0'
+
+# Shared botocore configuration: a pool large enough for concurrent uploads
+# and adaptive retries with backoff instead of re-handshaking on every call
+CLIENT_CONFIG = Config(
+    max_pool_connections=50,
+    retries={'max_attempts': 4, 'mode': 'adaptive'},
+    tcp_keepalive=True
+)
+
+# Text payloads are gzipped before upload and served with Content-Encoding: gzip;
+# images are already compressed and are sent as-is
+COMPRESSIBLE_CONTENT_TYPES = ('application/json', 'application/javascript', 'text/')
+
+
+def _encode_body(file_data: bytes, content_type: str) -> Tuple[bytes, Dict[str, str]]:
+    """Gzip compressible bodies and return them with the matching S3 arguments."""
+    if content_type.startswith(COMPRESSIBLE_CONTENT_TYPES):
+        return gzip.compress(file_data, compresslevel=3), {'ContentType': content_type, 'ContentEncoding': 'gzip'}
+    return file_data, {'ContentType': content_type}
+
+
+# Content types for the files Nova Act writes; anything else goes through mimetypes
+CONTENT_TYPES = {
+    '.json': 'application/json',
+    '.html': 'text/html',
+    '.png': 'image/png',
+    '.log': 'text/plain'
+}
+
+
+# Payloads at or above the threshold are sent as concurrent multipart uploads
+MULTIPART_THRESHOLD = 1024 * 1024
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=MULTIPART_THRESHOLD,
+    max_concurrency=4,
+    use_threads=True
+)
+
+# One S3 client per region, reused by every S3Uploader in this process
+_S3_CLIENTS = {}
+
+
+def _s3_client_options() -> Dict[str, Any]:
+    """Pick the S3 endpoint: Transfer Acceleration, a VPC endpoint, or the regional default."""
+    if os.environ.get('S3_ACCELERATE') == '1':
+        accelerate = Config(s3={'use_accelerate_endpoint': True, 'addressing_style': 'virtual'})
+        return {'config': CLIENT_CONFIG.merge(accelerate)}
+    
+    vpc_endpoint = os.environ.get('S3_VPC_ENDPOINT')
+    if vpc_endpoint:
+        return {'config': CLIENT_CONFIG, 'endpoint_url': vpc_endpoint}
+    
+    return {'config': CLIENT_CONFIG}
+
+
+def get_s3_client(aws_region: str) -> Any:
+    """Return the shared S3 client for a region, creating it once."""
+    client = _S3_CLIENTS.get(aws_region)
+    if client is None:
+        client = boto3.client('s3', region_name=aws_region, **_s3_client_options())
+        _S3_CLIENTS[aws_region] = client
+    return client
+
+
+def _iter_log_files(logs_dir: str, modified_since: Optional[float] = None) -> Iterator[Tuple[str, int]]:
+    """Yield (path, size) for the non-empty log files, optionally only recent ones."""
+    for root, dirs, files in os.walk(logs_dir):
+        for file in files:
+            file_path = os.path.join(root, file)
+            stat = os.stat(file_path)
+            
+            # Skip empty files
+            if stat.st_size == 0:
+                logger.debug(f"Skipping empty file: {file_path}")
+                continue
+            
+            # Skip files left over from earlier invocations
+            if modified_since is not None and stat.st_mtime < modified_since:
+                continue
+            
+            yield file_path, stat.st_size
+
 
 class S3Uploader:
     """Handles S3 uploads for images and logs."""
     
-    def __init__(self, s3_bucket: str, aws_region: str):
+    def __init__(self, s3_bucket: str, aws_region: str, s3_client: Optional[Any] = None):
         self.s3_bucket = s3_bucket
         self.aws_region = aws_region
-        self.s3_client = boto3.client('s3', region_name=aws_region)
-        self.today = datetime.now().strftime("%Y-%m-%d")
+        self.s3_client = s3_client or get_s3_client(aws_region)
+        self.today = today_str()
+        self._base_metadata = {
+            'download-date': self.today,
+            'source': 'usps-informed-delivery',
+            'automation-version': '1.0'
+        }
+        self._upload_pool = ThreadPoolExecutor(max_workers=IMAGE_UPLOAD_WORKERS)
+    
+    def upload_file_async(self, file_data: bytes, filename: str, content_type: str = 'image/png') -> Future:
+        """Queue an upload on the background pool and return its future."""
+        return self._upload_pool.submit(self.upload_file, file_data, filename, content_type)
+    
+    def close(self) -> None:
+        """Wait for queued uploads and release the background workers."""
+        self._upload_pool.shutdown(wait=True)
     
     def upload_file(self, file_data: bytes, filename: str, content_type: str = 'image/png') -> bool:
-        """Upload file data to S3 with retry logic."""
+        """Upload file data to S3; retries are handled by botocore."""
         s3_key = f"{self.today}/{filename}"
+        body, extra_args = _encode_body(file_data, content_type)
+        extra_args['Metadata'] = self._base_metadata
         
-        for attempt in range(3):  # Retry up to 3 times
-            try:
+        try:
+            if len(body) < MULTIPART_THRESHOLD:
                 self.s3_client.put_object(
                     Bucket=self.s3_bucket,
                     Key=s3_key,
-                    Body=file_data,
-                    ContentType=content_type,
-                    Metadata={
-                        'download-date': self.today,
-                        'source': 'usps-informed-delivery',
-                        'automation-version': '1.0'
-                    }
+                    Body=body,
+                    **extra_args
+                )
+            else:
+                self.s3_client.upload_fileobj(
+                    io.BytesIO(body),
+                    self.s3_bucket,
+                    s3_key,
+                    ExtraArgs=extra_args,
+                    Config=TRANSFER_CONFIG
                 )
-                logger.info(f"✓ Uploaded to S3: {s3_key}")
-                return True
-            except Exception as e:
-                logger.warning(f"S3 upload attempt {attempt + 1} failed: {e}")
-                if attempt == 2:  # Last attempt
-                    logger.error(f"Failed to upload {filename} after 3 attempts")
-                    return False
-        return False
+            logger.info(f"✓ Uploaded to S3: {s3_key}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to upload {filename}: {e}")
+            return False
     
-    def upload_logs(self, logs_dir: str) -> List[str]:
-        """Upload Nova Act logs to S3."""
+    def upload_logs(self, logs_dir: str, modified_since: Optional[float] = None) -> List[str]:
+        """Upload Nova Act logs to S3.
+        
+        With modified_since (a Unix timestamp), only files written since then
+        are uploaded.
+        """
         uploaded_logs = []
         
         if not os.path.exists(logs_dir):
             logger.warning("No logs directory found to upload")
             return uploaded_logs
         
+        if LOGS_AS_TARBALL:
+            return self.upload_logs_archived(logs_dir, modified_since)
+        
         try:
-            # Walk through logs directory and upload all files
-            for root, dirs, files in os.walk(logs_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    
-                    # Skip empty files
-                    if os.path.getsize(file_path) == 0:
-                        logger.debug(f"Skipping empty file: {file_path}")
-                        continue
-                    
-                    # Create relative path for S3 key
-                    rel_path = os.path.relpath(file_path, logs_dir)
-                    s3_key = f"{self.today}/logs/{rel_path}"
-                    
-                    try:
-                        # Determine content type based on file extension
-                        content_type = self._get_content_type(file)
-                        
-                        # Read and upload file
-                        with open(file_path, 'rb') as f:
-                            file_data = f.read()
-                        
-                        self.s3_client.put_object(
-                            Bucket=self.s3_bucket,
-                            Key=s3_key,
-                            Body=file_data,
-                            ContentType=content_type,
-                            Metadata={
-                                'upload-date': self.today,
-                                'source': 'nova-act-logs',
-                                'automation-version': '1.0',
-                                'log-type': 'automation-trace',
-                                'file-size': str(len(file_data))
-                            }
-                        )
-                        
-                        uploaded_logs.append(f"s3://{self.s3_bucket}/{s3_key}")
-                        logger.info(f"✓ Uploaded log to S3: {s3_key} ({len(file_data)} bytes)")
-                        
-                    except Exception as e:
-                        logger.warning(f"Failed to upload log file {file_path}: {e}")
-                        continue
+            # Walk through logs directory and collect all files to upload
+            log_files = []
+            for file_path, file_size in _iter_log_files(logs_dir, modified_since):
+                # Create relative path for S3 key
+                rel_path = os.path.relpath(file_path, logs_dir)
+                log_files.append((file_path, f"{self.today}/logs/{rel_path}", file_size))
+            
+            if log_files:
+                # Upload files concurrently over the shared connection pool
+                with ThreadPoolExecutor(max_workers=min(MAX_UPLOAD_WORKERS, len(log_files))) as executor:
+                    results = executor.map(lambda args: self._upload_log_file(*args), log_files)
+                    uploaded_logs = [s3_path for s3_path in results if s3_path]
                         
         except Exception as e:
             logger.error(f"Failed to upload logs to S3: {e}")
@@ -105,15 +197,98 @@ class S3Uploader:
         logger.info(f"Uploaded {len(uploaded_logs)} log files to S3")
         return uploaded_logs
     
+    def upload_logs_archived(self, logs_dir: str, modified_since: Optional[float] = None) -> List[str]:
+        """Upload the logs directory as a single gzipped tarball."""
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        s3_key = f"{self.today}/logs/nova-act-{timestamp}.tar.gz"
+        
+        try:
+            # Spool the archive to disk so memory use does not grow with the logs
+            with tempfile.TemporaryFile(dir='/tmp') as buffer:
+                file_count = 0
+                with tarfile.open(fileobj=buffer, mode='w:gz', compresslevel=6) as tar:
+                    for file_path, _ in _iter_log_files(logs_dir, modified_since):
+                        tar.add(file_path, arcname=os.path.join('logs', os.path.relpath(file_path, logs_dir)))
+                        file_count += 1
+                
+                if not file_count:
+                    logger.info("No log files to upload")
+                    return []
+                
+                archive_size = buffer.tell()
+                buffer.seek(0)
+                self.s3_client.upload_fileobj(
+                    buffer,
+                    self.s3_bucket,
+                    s3_key,
+                    ExtraArgs={
+                        'ContentType': 'application/gzip',
+                        'Metadata': {
+                            'upload-date': self.today,
+                            'source': 'nova-act-logs',
+                            'automation-version': '1.0',
+                            'log-type': 'automation-trace-archive',
+                            'file-count': str(file_count),
+                            'file-size': str(archive_size)
+                        }
+                    },
+                    Config=TRANSFER_CONFIG
+                )
+            
+            logger.info(f"✓ Uploaded {file_count} log files to S3: {s3_key} ({archive_size} bytes)")
+            return [f"s3://{self.s3_bucket}/{s3_key}"]
+            
+        except Exception as e:
+            logger.error(f"Failed to upload log archive to S3: {e}")
+            return []
+    
+    def _upload_log_file(self, file_path: str, s3_key: str, file_size: int) -> Optional[str]:
+        """Upload a single log file and return its S3 path."""
+        try:
+            # Determine content type based on file extension
+            content_type = self._get_content_type(file_path)
+            metadata = {
+                'upload-date': self.today,
+                'source': 'nova-act-logs',
+                'automation-version': '1.0',
+                'log-type': 'automation-trace',
+                'file-size': str(file_size)
+            }
+            
+            if content_type.startswith(COMPRESSIBLE_CONTENT_TYPES) and file_size < MULTIPART_THRESHOLD:
+                # Small text logs shrink well, so gzip them in memory
+                with open(file_path, 'rb') as f:
+                    body, extra_args = _encode_body(f.read(), content_type)
+                self.s3_client.put_object(
+                    Bucket=self.s3_bucket,
+                    Key=s3_key,
+                    Body=body,
+                    Metadata=metadata,
+                    **extra_args
+                )
+                uploaded_size = len(body)
+            else:
+                # Stream everything else straight from disk, so large traces
+                # never sit in memory
+                self.s3_client.upload_file(
+                    file_path,
+                    self.s3_bucket,
+                    s3_key,
+                    ExtraArgs={'ContentType': content_type, 'Metadata': metadata},
+                    Config=TRANSFER_CONFIG
+                )
+                uploaded_size = file_size
+            
+            logger.info(f"✓ Uploaded log to S3: {s3_key} ({uploaded_size} bytes)")
+            return f"s3://{self.s3_bucket}/{s3_key}"
+            
+        except Exception as e:
+            logger.warning(f"Failed to upload log file {file_path}: {e}")
+            return None
+    
     def _get_content_type(self, filename: str) -> str:
         """Determine content type based on file extension."""
-        if filename.endswith('.json'):
-            return 'application/json'
-        elif filename.endswith('.html'):
-            return 'text/html'
-        elif filename.endswith('.png'):
-            return 'image/png'
-        elif filename.endswith('.log'):
-            return 'text/plain'
-        else:
-            return 'text/plain'
\ No newline at end of file
+        extension = os.path.splitext(filename)[1].lower()
+        if extension in CONTENT_TYPES:
+            return CONTENT_TYPES[extension]
+        return mimetypes.guess_type(filename)[0] or 'text/plain'
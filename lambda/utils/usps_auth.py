@@ -3,73 +3,220 @@ USPS authentication and navigation module.
 Handles login and navigation to Informed Delivery.
 """
 
+import os
+import re
+import json
 import logging
-from typing import Optional
-from nova_act import NovaAct
+from urllib.parse import urlsplit
+from typing import TYPE_CHECKING, Optional, Any
+from .nova_act_config import USPS_HOME_URL
+
+if TYPE_CHECKING:
+    from nova_act import NovaAct
+    from playwright.sync_api import Locator
 
 logger = logging.getLogger(__name__)
 
+# Authenticated cookies saved after a successful run; /tmp survives warm invocations
+SESSION_STATE_PATH = '/tmp/usps_state.json'
+INFORMED_DELIVERY_URL = 'https://informeddelivery.usps.com/box/pages/secure/DashboardAction_input.action'
+DASHBOARD_URL_MARKER = 'DashboardAction'
+
 
 class USPSAuthenticator:
     """Handles USPS website authentication and navigation."""
     
-    def __init__(self, nova_act: NovaAct, username: str, password: str):
+    # Stable usps.com selectors tried before falling back to a Nova Act prompt
+    SIGN_IN_SELECTOR = 'a[href*="LoginAction"]'
+    USERNAME_SELECTOR = '#username'
+    PASSWORD_SELECTOR = '#password'
+    SUBMIT_SELECTOR = '#btn-submit'
+    INFORMED_DELIVERY_SELECTOR = 'a[href*="informeddelivery"]'
+    SELECTOR_TIMEOUT = 5000
+    
+    # Accessible names tried when the ids above change
+    USERNAME_NAME = re.compile(r'user', re.IGNORECASE)
+    PASSWORD_NAME = re.compile(r'password', re.IGNORECASE)
+    SUBMIT_NAME = re.compile(r'sign in|log in', re.IGNORECASE)
+    
+    # Nova Act prompts
+    SIGN_IN_PROMPT = (
+        "I need to access my personal USPS account to check my mail. "
+        "Click on the 'sign in' button on the top right of the main page. "
+        "If you're already on a sign-in page, just proceed to the login form."
+    )
+    USERNAME_PROMPT = "Find the username input field and click on it to focus it."
+    PASSWORD_PROMPT = "Now find the password input field and click on it to focus it."
+    SUBMIT_PROMPT = "Click the sign in button to submit the login form."
+    INFORMED_DELIVERY_PROMPT = (
+        "Click 'Informed Delivery' button or link. "
+        "If you're already on the Informed Delivery page, just proceed."
+    )
+    INFORMED_DELIVERY_SIGN_IN_PROMPT = (
+        "Look for and click a 'Sign In' button specifically for Informed Delivery. "
+        "It might be below title text that says 'Informed Delivery by USPS'. "
+        "If you're already signed in or on the main Informed Delivery page, just proceed."
+    )
+    
+    def __init__(self, nova_act: 'NovaAct', username: str, password: str):
         self.nova_act = nova_act
         self.username = username
         self.password = password
+        self.session_restored = False
     
     def start_and_navigate(self) -> None:
         """Start session and navigate to login."""
         try:
-            self.nova_act.start()
-            logger.info("Nova Act session started")
+            if self.nova_act.started:
+                # Browser reused from a previous invocation
+                self.nova_act.page.goto(USPS_HOME_URL)
+                logger.info("Reused Nova Act session navigated to start page")
+            else:
+                self.nova_act.start()
+                logger.info("Nova Act session started")
+            
+            # Skip the whole sign-in flow when a saved session is still valid
+            if self._restore_session():
+                logger.info("Restored saved USPS session, skipping sign in")
+                return
             
             # Navigate to sign in with explicit URL tracking to prevent loops
             current_url = self.nova_act.page.url
             logger.info(f"Starting URL: {current_url}")
             
-            account_search = self.nova_act.act(
-                "I need to access my personal USPS account to check my mail. "
-                "Click on the 'sign in' button on the top right of the main page. "
-                "If you're already on a sign-in page, just proceed to the login form."
-            )
+            account_search = self._click_or_act(self.SIGN_IN_SELECTOR, self.SIGN_IN_PROMPT)
             logger.info(f"Navigation result: {account_search}")
             
         except Exception as e:
             logger.error(f"Failed to start and navigate: {e}")
             raise
     
+    def _restore_session(self) -> bool:
+        """Load saved cookies and check they still reach Informed Delivery."""
+        if not os.path.exists(SESSION_STATE_PATH):
+            return False
+        
+        page = self.nova_act.page
+        try:
+            with open(SESSION_STATE_PATH) as f:
+                cookies = json.load(f).get('cookies', [])
+            page.context.add_cookies(cookies)
+            page.goto(INFORMED_DELIVERY_URL, wait_until='domcontentloaded')
+            
+            # Only a session that lands on the dashboard is valid; an expired one
+            # redirects to login (which may carry the dashboard URL in its query), and
+            # intro or error pages are not the dashboard either
+            if DASHBOARD_URL_MARKER not in urlsplit(page.url).path:
+                logger.info(f"Saved USPS session did not reach the dashboard: {page.url}")
+                page.goto(USPS_HOME_URL)
+                return False
+            
+            self.session_restored = True
+            return True
+            
+        except Exception as e:
+            logger.warning(f"Could not restore saved session: {e}")
+            return False
+    
+    def _save_session(self) -> None:
+        """Persist authenticated cookies for the next warm invocation."""
+        try:
+            self.nova_act.page.context.storage_state(path=SESSION_STATE_PATH)
+            os.chmod(SESSION_STATE_PATH, 0o600)
+            logger.info("Saved USPS session state")
+        except Exception as e:
+            logger.warning(f"Could not save session state: {e}")
+    
+    def _wait_for_page_state(self, selector: Optional[str] = None, timeout: int = 15000) -> None:
+        """Wait for a selector to become visible, or for the DOM to load."""
+        try:
+            if selector:
+                self.nova_act.page.wait_for_selector(selector, state='visible', timeout=timeout)
+            else:
+                self.nova_act.page.wait_for_load_state('domcontentloaded', timeout=timeout)
+        except Exception as e:
+            logger.warning(f"Page not ready after {timeout} ms, continuing: {e}")
+    
+    def _click_or_act(self, selector: str, prompt: str, fallback: Optional['Locator'] = None) -> Any:
+        """Click a known element directly, falling back to Nova Act if it is missing."""
+        from playwright.sync_api import Error as PlaywrightError
+        for target in filter(None, (selector, fallback)):
+            try:
+                if isinstance(target, str):
+                    self.nova_act.page.click(target, timeout=self.SELECTOR_TIMEOUT)
+                else:
+                    target.click(timeout=self.SELECTOR_TIMEOUT)
+                return f"Clicked {target}"
+            except PlaywrightError as e:
+                logger.info(f"{target} unavailable: {e}")
+        
+        logger.info("Falling back to Nova Act")
+        return self.nova_act.act(prompt)
+    
+    def _fill_or_act(self, selector: str, value: str, prompt: str, fallback: Optional['Locator'] = None) -> Any:
+        """Fill a known input directly, falling back to Nova Act focus plus typing."""
+        from playwright.sync_api import Error as PlaywrightError
+        for target in filter(None, (selector, fallback)):
+            try:
+                if isinstance(target, str):
+                    self.nova_act.page.fill(target, value, timeout=self.SELECTOR_TIMEOUT)
+                else:
+                    target.fill(value, timeout=self.SELECTOR_TIMEOUT)
+                return f"Filled {target}"
+            except PlaywrightError as e:
+                logger.info(f"{target} unavailable: {e}")
+        
+        # The credential is typed, never put in the prompt
+        logger.info("Falling back to Nova Act")
+        result = self.nova_act.act(prompt)
+        self.nova_act.page.keyboard.type(value)
+        return result
+    
     def attempt_login(self) -> bool:
         """Attempt to login with credentials."""
+        if self.session_restored:
+            return True
+        
         try:
-            # Find and focus username field
-            username_field = self.nova_act.act("Find the username input field and click on it to focus it.")
-            logger.info(f"Username field focused: {username_field}")
+            # Wait for the login form to render instead of sleeping a fixed time
+            self._wait_for_page_state('input[type="password"]')
             
-            # Type username
-            self.nova_act.page.keyboard.type(self.username)
-            logger.info("Username entered")
+            page = self.nova_act.page
             
-            # Find and focus password field
-            password_field = self.nova_act.act("Now find the password input field and click on it to focus it.")
-            logger.info(f"Password field focused: {password_field}")
+            # Enter username
+            username_field = self._fill_or_act(
+                self.USERNAME_SELECTOR, self.username,
+                self.USERNAME_PROMPT,
+                fallback=page.get_by_role('textbox', name=self.USERNAME_NAME)
+            )
+            logger.info(f"Username entered: {username_field}")
             
-            # Type password
-            self.nova_act.page.keyboard.type(self.password)
-            logger.info("Password entered")
+            # Enter password
+            password_field = self._fill_or_act(
+                self.PASSWORD_SELECTOR, self.password,
+                self.PASSWORD_PROMPT,
+                fallback=page.get_by_label(self.PASSWORD_NAME)
+            )
+            logger.info(f"Password entered: {password_field}")
             
             # Submit form
-            submit_result = self.nova_act.act("Click the sign in button to submit the login form.")
+            submit_result = self._click_or_act(
+                self.SUBMIT_SELECTOR,
+                self.SUBMIT_PROMPT,
+                fallback=page.get_by_role('button', name=self.SUBMIT_NAME)
+            )
             logger.info(f"Submit result: {submit_result}")
             
-            # Check login success
-            login_check = self.nova_act.act(
-                "Check if the login was successful. Look for signs that I'm now logged in, "
-                "such as a user menu, account dashboard, or welcome message. "
-                "If there are any error messages, please report them."
-            )
-            logger.info(f"Login check: {login_check}")
+            # A successful login navigates away from the password form; a failed
+            # one leaves it on screen
+            from playwright.sync_api import Error as PlaywrightError
+            try:
+                page.wait_for_selector('input[type="password"]', state='hidden', timeout=15000)
+            except PlaywrightError:
+                logger.error(f"Login did not complete, still on the sign-in form: {page.url}")
+                return False
             
+            logger.info(f"Login succeeded: {page.url}")
             return True
             
         except Exception as e:
@@ -78,26 +225,24 @@ class USPSAuthenticator:
     
     def find_informed_delivery(self) -> bool:
         """Navigate to Informed Delivery section."""
+        if self.session_restored:
+            # Restoring the session already landed on the Informed Delivery dashboard
+            return True
+        
         try:
             # Track current URL to detect navigation loops
             current_url = self.nova_act.page.url
             logger.info(f"Current URL before Informed Delivery search: {current_url}")
             
             # Look for Informed Delivery with loop prevention
-            delivery_result = self.nova_act.act(
-                "Click 'Informed Delivery' button or link. "
-                "If you're already on the Informed Delivery page, just proceed."
-            )
+            delivery_result = self._click_or_act(self.INFORMED_DELIVERY_SELECTOR, self.INFORMED_DELIVERY_PROMPT)
             logger.info(f"Informed Delivery navigation: {delivery_result}")
             
             # Look for sign-in button with specific context
-            signin_result = self.nova_act.act(
-                "Look for and click a 'Sign In' button specifically for Informed Delivery. "
-                "It might be below title text that says 'Informed Delivery by USPS'. "
-                "If you're already signed in or on the main Informed Delivery page, just proceed."
-            )
+            signin_result = self.nova_act.act(self.INFORMED_DELIVERY_SIGN_IN_PROMPT)
             logger.info(f"Informed Delivery sign-in: {signin_result}")
-
+            
+            self._save_session()
             return True
             
         except Exception as e:
@@ -4,20 +4,102 @@ Local USPS Informed Delivery automation using Nova Act.
 Runs locally without AWS dependencies.
 """
 
+import io
 import os
 import json
+import shutil
 import logging
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from urllib.parse import urlsplit
+from typing import TYPE_CHECKING, Optional, Iterator, List, Dict, Any
 
-from nova_act import NovaAct
-from nova_act.types.act_result import ActResult
-from nova_act.types.act_errors import ActAgentError, ActClientError, ActExecutionError, ActServerError
+if TYPE_CHECKING:
+    from nova_act import NovaAct
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; fall back to per-element screenshots
+    Image = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+USPS_HOME_URL = "https://www.usps.com/"
+INFORMED_DELIVERY_URL = 'https://informeddelivery.usps.com/box/pages/secure/DashboardAction_input.action'
+DASHBOARD_URL_MARKER = 'DashboardAction'
+SESSION_STATE_FILE = '.usps_state.json'
+
+# Nova Act prompts
+SIGN_IN_PROMPT = (
+    "I need to access my personal USPS account to check my mail. "
+    "Click on the 'sign in' button on the top right of the main page. "
+    "If you're already on a sign-in page, just proceed to the login form."
+)
+USERNAME_PROMPT = "Find the username input field and click on it to focus it."
+PASSWORD_PROMPT = "Now find the password input field and click on it to focus it."
+SUBMIT_PROMPT = "Click the sign in button to submit the login form."
+LOGIN_CHECK_PROMPT = (
+    "Check if the login was successful. Look for signs that I'm now logged in, "
+    "such as a user menu, account dashboard, or welcome message. "
+    "If there are any error messages, please report them."
+)
+INFORMED_DELIVERY_PROMPT = (
+    "Click 'Informed Delivery' button or link. "
+    "If you're already on the Informed Delivery page, just proceed."
+)
+INFORMED_DELIVERY_SIGN_IN_PROMPT = (
+    "Look for and click a 'Sign In' button specifically for Informed Delivery. "
+    "It might be below title text that says 'Informed Delivery by USPS'. "
+    "If you're already signed in or on the main Informed Delivery page, just proceed."
+)
+MAIL_CHECK_PROMPT = "I am now in my Informed Delivery section. Look for today's mail images "
+CLASSIFY_PROMPT = (
+    "Examine every mail image on the page that has a data-mail-idx attribute. "
+    "Look for addressing information such as: "
+    "- Recipient name and address "
+    "- Street address, city, state, zip code "
+    "- Return address information "
+    "- Any text that looks like mailing labels "
+    "Return the data-mail-idx values of the images where you can clearly see "
+    "addressing information. Leave out images that are blank, just a logo, "
+    "or contain no addressing text."
+)
+
+# Structured response for the batched address classification
+ADDRESS_INDICES_SCHEMA = {'type': 'array', 'items': {'type': 'integer'}}
+
+# Substrings in an image's src or alt that mark it as page chrome rather than mail
+SKIP_KEYWORDS = ('logo', 'banner', 'icon', 'button', 'nav')
+
+# Browser-side helpers so attributes and geometry for all images come back in one call
+IMAGE_ATTRIBUTES_JS = (
+    "els => els.map(e => ({src: e.getAttribute('src') || '', alt: e.getAttribute('alt') || ''}))"
+)
+IMAGE_BOXES_JS = """els => els.map(e => {
+    const r = e.getBoundingClientRect();
+    return {x: r.x + window.scrollX, y: r.y + window.scrollY, width: r.width, height: r.height};
+})"""
+
+# Upper bound on concurrent log file copies
+MAX_COPY_WORKERS = 8
+
+
+def _iter_log_files(directory: str) -> Iterator[str]:
+    """Yield the non-empty files under directory, reusing the stat data scandir returns."""
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _iter_log_files(entry.path)
+            elif entry.is_file():
+                # Skip empty files
+                if entry.stat().st_size == 0:
+                    logger.debug(f"Skipping empty file: {entry.path}")
+                    continue
+                yield entry.path
+
 
 class LocalUSPSAutomator:
     """Local USPS automation class without AWS dependencies."""
@@ -26,7 +108,17 @@ class LocalUSPSAutomator:
         self.username = username
         self.password = password
         self.output_dir = output_dir
-        self.nova_act: Optional[NovaAct] = None
+        self.nova_act: Optional['NovaAct'] = None
+        
+        # Environment settings, read once
+        self._api_key = os.environ.get("NOVA_ACT_API_KEY")
+        self._save_logs = os.environ.get('SAVE_LOGS', 'true').lower() == 'true'
+        # Saved cookies grant access to the USPS account, so persisting them is opt-in
+        self._reuse_session = os.environ.get('REUSE_SESSION', 'false').lower() == 'true'
+        
+        # Authenticated cookies saved after a successful run, reused by the next one
+        self.session_state_path = os.path.join(self.output_dir, SESSION_STATE_FILE)
+        self.session_restored = False
         
         # Create output directory
         os.makedirs(self.output_dir, exist_ok=True)
@@ -35,19 +127,21 @@ class LocalUSPSAutomator:
         self.today = datetime.now().strftime("%Y-%m-%d")
         self.today_dir = os.path.join(self.output_dir, self.today)
         os.makedirs(self.today_dir, exist_ok=True)
+        # Filenames are generated here, so a plain prefix is safe to concatenate
+        self._today_prefix = self.today_dir + os.sep
     
-    def _save_to_file(self, file_data: bytes, filename: str) -> bool:
-        """Save file data to local directory."""
-        file_path = os.path.join(self.today_dir, filename)
+    def _save_to_file(self, file_data: bytes, filename: str) -> Optional[str]:
+        """Save file data to local directory and return its path."""
+        file_path = self._today_prefix + filename
         
         try:
             with open(file_path, 'wb') as f:
                 f.write(file_data)
             logger.info(f"✓ Saved to file: {file_path}")
-            return True
+            return file_path
         except Exception as e:
             logger.error(f"Failed to save {filename}: {e}")
-            return False
+            return None
     
     def _save_logs_to_file(self) -> List[str]:
         """Save Nova Act logs to local directory."""
@@ -62,34 +156,22 @@ class LocalUSPSAutomator:
         os.makedirs(logs_output_dir, exist_ok=True)
         
         try:
-            # Walk through logs directory and copy all files
-            for root, dirs, files in os.walk(self.logs_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    
-                    # Skip empty files
-                    if os.path.getsize(file_path) == 0:
-                        logger.debug(f"Skipping empty file: {file_path}")
-                        continue
-                    
-                    # Create relative path for output
-                    rel_path = os.path.relpath(file_path, self.logs_dir)
-                    output_path = os.path.join(logs_output_dir, rel_path)
-                    
-                    # Create subdirectories if needed
-                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                    
-                    try:
-                        # Copy file
-                        with open(file_path, 'rb') as src, open(output_path, 'wb') as dst:
-                            dst.write(src.read())
-                        
-                        saved_logs.append(output_path)
-                        logger.info(f"✓ Saved log to: {output_path}")
-                        
-                    except Exception as e:
-                        logger.warning(f"Failed to save log file {file_path}: {e}")
-                        continue
+            # Walk through logs directory and collect all files to copy
+            log_files = []
+            for file_path in _iter_log_files(self.logs_dir):
+                # Create relative path for output
+                rel_path = os.path.relpath(file_path, self.logs_dir)
+                log_files.append((file_path, os.path.join(logs_output_dir, rel_path)))
+            
+            # Create each output subdirectory once
+            for output_dir in {os.path.dirname(output_path) for _, output_path in log_files}:
+                os.makedirs(output_dir, exist_ok=True)
+            
+            if log_files:
+                # Copy files concurrently; each copy is independent and I/O-bound
+                with ThreadPoolExecutor(max_workers=min(MAX_COPY_WORKERS, len(log_files))) as executor:
+                    results = executor.map(lambda args: self._copy_log_file(*args), log_files)
+                    saved_logs = [output_path for output_path in results if output_path]
                         
         except Exception as e:
             logger.error(f"Failed to save logs: {e}")
@@ -97,6 +179,18 @@ class LocalUSPSAutomator:
         logger.info(f"Saved {len(saved_logs)} log files")
         return saved_logs
     
+    def _copy_log_file(self, file_path: str, output_path: str) -> Optional[str]:
+        """Copy a single log file and return its output path."""
+        try:
+            # Copy file; copyfile uses the kernel's zero-copy path where available
+            shutil.copyfile(file_path, output_path)
+            logger.info(f"✓ Saved log to: {output_path}")
+            return output_path
+            
+        except Exception as e:
+            logger.warning(f"Failed to save log file {file_path}: {e}")
+            return None
+    
     def initialize_nova_act(self) -> None:
         """Initialize Nova Act for local environment."""
         try:
@@ -106,14 +200,17 @@ class LocalUSPSAutomator:
             
             logger.info("Initializing Nova Act for local environment...")
             
+            # Deferred import: nova_act pulls in Playwright and is only needed here
+            from nova_act import NovaAct
+            
             # Initialize Nova Act with local configuration
             self.nova_act = NovaAct(
-                starting_page="https://www.usps.com/",
+                starting_page=USPS_HOME_URL,
                 headless=False,  # Can be visible for local testing
                 logs_directory=self.logs_dir,
                 clone_user_data_dir=False,
                 go_to_url_timeout=60,
-                nova_act_api_key=os.environ.get("NOVA_ACT_API_KEY")
+                nova_act_api_key=self._api_key
             )
             
             logger.info("Nova Act initialized successfully for local environment")
@@ -121,7 +218,6 @@ class LocalUSPSAutomator:
         except Exception as e:
             logger.error(f"Failed to initialize Nova Act: {e}")
             logger.error(f"Error type: {type(e).__name__}")
-            import traceback
             logger.error(f"Full traceback: {traceback.format_exc()}")
             raise
     
@@ -131,28 +227,82 @@ class LocalUSPSAutomator:
             self.nova_act.start()
             logger.info("Nova Act session started")
             
+            # Skip the whole sign-in flow when a saved session is still valid
+            if self._restore_session():
+                logger.info("Restored saved USPS session, skipping sign in")
+                return
+            
             # Navigate to sign in with explicit URL tracking to prevent loops
             current_url = self.nova_act.page.url
             logger.info(f"Starting URL: {current_url}")
             
-            account_search = self.nova_act.act(
-                "I need to access my personal USPS account to check my mail. "
-                "Click on the 'sign in' button on the top right of the main page. "
-                "If you're already on a sign-in page, just proceed to the login form."
-            )
+            account_search = self.nova_act.act(SIGN_IN_PROMPT)
             logger.info(f"Navigation result: {account_search}")
             
         except Exception as e:
             logger.error(f"Failed to start and navigate: {e}")
             raise
     
+    def _restore_session(self) -> bool:
+        """Load saved cookies and check they still reach Informed Delivery."""
+        if not self._reuse_session or not os.path.exists(self.session_state_path):
+            return False
+        
+        page = self.nova_act.page
+        try:
+            with open(self.session_state_path) as f:
+                cookies = json.load(f).get('cookies', [])
+            page.context.add_cookies(cookies)
+            page.goto(INFORMED_DELIVERY_URL, wait_until='domcontentloaded')
+            
+            # Only a session that lands on the dashboard is valid; an expired one
+            # redirects to login (which may carry the dashboard URL in its query), and
+            # intro or error pages are not the dashboard either
+            if DASHBOARD_URL_MARKER not in urlsplit(page.url).path:
+                logger.info(f"Saved USPS session did not reach the dashboard: {page.url}")
+                page.goto(USPS_HOME_URL)
+                return False
+            
+            self.session_restored = True
+            return True
+            
+        except Exception as e:
+            logger.warning(f"Could not restore saved session: {e}")
+            return False
+    
+    def _save_session(self) -> None:
+        """Persist authenticated cookies for the next run."""
+        if not self._reuse_session:
+            return
+        
+        try:
+            self.nova_act.page.context.storage_state(path=self.session_state_path)
+            os.chmod(self.session_state_path, 0o600)
+            logger.info("Saved USPS session state")
+        except Exception as e:
+            logger.warning(f"Could not save session state: {e}")
+    
+    def _wait_for_page_state(self, selector: Optional[str] = None, timeout: int = 15000) -> None:
+        """Wait for a selector to become visible, or for the DOM to load."""
+        try:
+            if selector:
+                self.nova_act.page.wait_for_selector(selector, state='visible', timeout=timeout)
+            else:
+                self.nova_act.page.wait_for_load_state('domcontentloaded', timeout=timeout)
+        except Exception as e:
+            logger.warning(f"Page not ready after {timeout} ms, continuing: {e}")
+    
     def attempt_login(self) -> bool:
         """Attempt to login with credentials."""
+        if self.session_restored:
+            return True
+        
         try:
-            # self.nova_act.page.wait_for_timeout(3000)
+            # Wait for the login form to render instead of sleeping a fixed time
+            self._wait_for_page_state('input[type="password"]')
             
             # Find and focus username field
-            username_field = self.nova_act.act("Find the username input field and click on it to focus it.")
+            username_field = self.nova_act.act(USERNAME_PROMPT)
             logger.info(f"Username field focused: {username_field}")
             
             # Type username
@@ -160,7 +310,7 @@ class LocalUSPSAutomator:
             logger.info("Username entered")
             
             # Find and focus password field
-            password_field = self.nova_act.act("Now find the password input field and click on it to focus it.")
+            password_field = self.nova_act.act(PASSWORD_PROMPT)
             logger.info(f"Password field focused: {password_field}")
             
             # Type password
@@ -168,17 +318,13 @@ class LocalUSPSAutomator:
             logger.info("Password entered")
             
             # Submit form
-            submit_result = self.nova_act.act("Click the sign in button to submit the login form.")
+            submit_result = self.nova_act.act(SUBMIT_PROMPT)
             logger.info(f"Submit result: {submit_result}")
             
-            # Wait and check login success
-            # self.nova_act.page.wait_for_timeout(6000)
+            # Wait for the post-login page to load, then check login success
+            self._wait_for_page_state()
             
-            login_check = self.nova_act.act(
-                "Check if the login was successful. Look for signs that I'm now logged in, "
-                "such as a user menu, account dashboard, or welcome message. "
-                "If there are any error messages, please report them."
-            )
+            login_check = self.nova_act.act(LOGIN_CHECK_PROMPT)
             logger.info(f"Login check: {login_check}")
             
             return True
@@ -189,43 +335,111 @@ class LocalUSPSAutomator:
 
     def find_informed_delivery(self) -> bool:
         """Navigate to Informed Delivery section."""
+        if self.session_restored:
+            # Restoring the session already landed on the Informed Delivery dashboard
+            return True
+        
         try:
             # Track current URL to detect navigation loops
             current_url = self.nova_act.page.url
             logger.info(f"Current URL before Informed Delivery search: {current_url}")
             
             # Look for Informed Delivery with loop prevention
-            delivery_result = self.nova_act.act(
-                "Click 'Informed Delivery' button or link. "
-                "If you're already on the Informed Delivery page, just proceed."
-            )
+            delivery_result = self.nova_act.act(INFORMED_DELIVERY_PROMPT)
             logger.info(f"Informed Delivery navigation: {delivery_result}")
             
             # Look for sign-in button with specific context
-            signin_result = self.nova_act.act(
-                "Look for and click a 'Sign In' button specifically for Informed Delivery. "
-                "It might be below title text that says 'Informed Delivery by USPS'. "
-                "If you're already signed in or on the main Informed Delivery page, just proceed."
-            )
+            signin_result = self.nova_act.act(INFORMED_DELIVERY_SIGN_IN_PROMPT)
             logger.info(f"Informed Delivery sign-in: {signin_result}")
-
+            
+            self._save_session()
             return True
             
         except Exception as e:
             logger.error(f"Failed to find Informed Delivery: {e}")
             return False
     
+    def _filter_address_images(self, images: Dict[str, Any]) -> Dict[str, Any]:
+        """Keep the images Nova Act finds addressing information in, using a single call.
+        
+        images maps each src to its element.
+        """
+        if not images:
+            return {}
+        
+        try:
+            # Tag the images so the prompt can refer to them by index
+            self.nova_act.page.evaluate(
+                "els => els.forEach((e, i) => e.setAttribute('data-mail-idx', i))",
+                list(images.values())
+            )
+            
+            result = self.nova_act.act_get(CLASSIFY_PROMPT, schema=ADDRESS_INDICES_SCHEMA)
+            if not result.matches_schema:
+                raise ValueError(f"unexpected classification response: {result.response}")
+            address_indices = set(result.parsed_response)
+            
+        except Exception as e:
+            logger.warning(f"Failed to analyze images: {e}")
+            # If analysis fails, include the images to be safe (better to have false positives)
+            logger.info(f"⚠ Including all {len(images)} images due to analysis failure")
+            return images
+        
+        address_images = {}
+        for i, (src, img) in enumerate(images.items()):
+            if i in address_indices:
+                address_images[src] = img
+                logger.info(f"✓ Image {i+1} contains address information")
+            else:
+                logger.info(f"✗ Image {i+1} filtered out - no address information")
+        
+        return address_images
+    
+    def _crop_images_from_page(self, images: List) -> List[Optional[bytes]]:
+        """Crop each image out of a single full-page screenshot, as PNG bytes.
+        
+        Entries are None where the crop is unavailable (no Pillow, a failed page
+        capture, or an invisible image); those fall back to img.screenshot().
+        """
+        if Image is None or not images:
+            return [None] * len(images)
+        
+        try:
+            # Page-relative geometry for every image in one round-trip
+            page = self.nova_act.page
+            boxes = page.evaluate(IMAGE_BOXES_JS, images)
+            page_image = Image.open(io.BytesIO(page.screenshot(full_page=True, scale='css')))
+            page_image.load()
+        except Exception as e:
+            logger.warning(f"Full page capture failed, falling back to per-image screenshots: {e}")
+            return [None] * len(images)
+        
+        crops = []
+        for box in boxes:
+            if not box['width'] or not box['height']:
+                crops.append(None)
+                continue
+            
+            left, top = box['x'], box['y']
+            crop = page_image.crop((
+                round(left), round(top),
+                round(left + box['width']), round(top + box['height'])
+            ))
+            buffer = io.BytesIO()
+            crop.save(buffer, 'PNG')
+            crops.append(buffer.getvalue())
+        
+        return crops
+    
     def check_mail_images(self) -> List[str]:
         """Check for today's mail images and save to local directory."""
         saved_files = []
-        
-        # Check if address filtering is enabled
+        # One timestamp per run; the image number keeps filenames unique
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         
         try:
             # Check what's available
-            mail_check = self.nova_act.act(
-                "I am now in my Informed Delivery section. Look for today's mail images "
-            )
+            mail_check = self.nova_act.act(MAIL_CHECK_PROMPT)
             logger.info(f"Mail check: {mail_check}")
             
             # Search for mail images and filter for those with addresses
@@ -235,79 +449,54 @@ class LocalUSPSAutomator:
                 'img[src*="mail"]'
             ]
             
-            all_images = []
-            for selector in selectors:
-                images = self.nova_act.page.query_selector_all(selector)
-                logger.info(f"Found {len(images)} potential images with selector: {selector}")
+            # One combined query; the browser returns each matching element once
+            combined_selector = ', '.join(selectors)
+            page = self.nova_act.page
+            images = page.query_selector_all(combined_selector)
+            logger.info(f"Found {len(images)} potential images with selector: {combined_selector}")
+            
+            # Read src/alt for every image in a single round-trip, from the handles
+            # already held so each attribute set stays paired with its element
+            attributes = page.evaluate(IMAGE_ATTRIBUTES_JS, images)
+            
+            # Unique candidates keyed by src, so each image is analyzed at most once
+            candidates = {}
+            for i, (img, attrs) in enumerate(zip(images, attributes)):
+                # First, check if the image source or alt text suggests it's a mail piece
+                src, alt = attrs['src'], attrs['alt']
+                if not src or src in candidates:
+                    continue
                 
-                # Check each image for address content using Nova Act
-                for i, img in enumerate(images):
-                    try:
-                        # First, check if the image source or alt text suggests it's a mail piece
-                        src = img.get_attribute('src') or ''
-                        alt = img.get_attribute('alt') or ''
-                        
-                        # Skip obvious non-mail images
-                        skip_keywords = ['logo', 'banner', 'icon', 'button', 'nav']
-                        if any(keyword in src.lower() or keyword in alt.lower() for keyword in skip_keywords):
-                            logger.info(f"✗ Skipping image {i+1} - appears to be UI element: {src}")
-                            continue
-                        
-                        # Use Nova Act to analyze the image content for address information
-                        analysis_result = self.nova_act.act(
-                            f"Examine this mail image carefully. Look for addressing information such as: "
-                            f"- Recipient name and address "
-                            f"- Street address, city, state, zip code "
-                            f"- Return address information "
-                            f"- Any text that looks like mailing labels "
-                            f"Respond with 'HAS_ADDRESS' if you can clearly see addressing information, "
-                            f"or 'NO_ADDRESS' if it's blank, just a logo, or contains no addressing text.",
-                            element=img
-                        )
-                        
-                        # Check if Nova Act found address information
-                        analysis_text = str(analysis_result).upper()
-                        if 'HAS_ADDRESS' in analysis_text or any(keyword in analysis_text for keyword in ['ADDRESS', 'RECIPIENT', 'STREET', 'ZIP']):
-                            all_images.append(img)
-                            logger.info(f"✓ Image {i+1} contains address information: {analysis_result}")
-                        else:
-                            logger.info(f"✗ Image {i+1} filtered out - no address information: {analysis_result}")
-                            
-                    except Exception as e:
-                        logger.warning(f"Failed to analyze image {i+1}: {e}")
-                        # If analysis fails, include the image to be safe (better to have false positives)
-                        all_images.append(img)
-                        logger.info(f"⚠ Including image {i+1} due to analysis failure")
-                        continue
-            
-            # Remove duplicates
-            unique_images = []
-            seen_srcs = set()
-            for img in all_images:
-                src = img.get_attribute('src')
-                if src and src not in seen_srcs:
-                    unique_images.append(img)
-                    seen_srcs.add(src)
+                # Skip obvious non-mail images
+                src_lower, alt_lower = src.lower(), alt.lower()
+                if any(keyword in src_lower or keyword in alt_lower for keyword in SKIP_KEYWORDS):
+                    logger.info(f"✗ Skipping image {i+1} - appears to be UI element: {src}")
+                    continue
+                
+                candidates[src] = img
             
+            # Analyze all candidates for address content with one Nova Act call
+            unique_images = self._filter_address_images(candidates)
             logger.info(f"Found {len(unique_images)} unique mail images")
             
-            # Process each image
-            for i, img in enumerate(unique_images):
+            # Crop every image out of one page screenshot where possible
+            crops = self._crop_images_from_page(list(unique_images.values()))
+            
+            # Process each image; src was read once when the candidates were collected
+            for i, ((src, img), crop) in enumerate(zip(unique_images.items(), crops)):
                 try:
-                    src = img.get_attribute('src')
-                    if src:
-                        logger.info(f"Processing image {i+1}: {src}")
-                        
-                        # Take screenshot of the image element
-                        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                        filename = f"mail_image_{i+1}_{timestamp}.png"
-                        
-                        # Screenshot to bytes
-                        screenshot_bytes = img.screenshot()
-                        
-                        # Save to local file
-                        if self._save_to_file(screenshot_bytes, filename):
-                            saved_files.append(os.path.join(self.today_dir, filename))
+                    logger.info(f"Processing image {i+1}: {src}")
+                    
+                    # Take screenshot of the image element
+                    filename = f"mail_image_{i+1}_{timestamp}.png"
+                    
+                    # Screenshot to bytes, unless the page capture already covered it
+                    screenshot_bytes = crop if crop is not None else img.screenshot()
+                    
+                    # Save to local file
+                    file_path = self._save_to_file(screenshot_bytes, filename)
+                    if file_path:
+                        saved_files.append(file_path)
                         
                 except Exception as e:
                     logger.warning(f"Failed to process image {i+1}: {e}")
@@ -317,13 +506,13 @@ class LocalUSPSAutomator:
             if not saved_files:
                 logger.info("No images found, taking full page screenshot")
                 try:
-                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
                     filename = f"mail_preview_full_{timestamp}.png"
                     
                     screenshot_bytes = self.nova_act.page.screenshot(full_page=True)
                     
-                    if self._save_to_file(screenshot_bytes, filename):
-                        saved_files.append(os.path.join(self.today_dir, filename))
+                    file_path = self._save_to_file(screenshot_bytes, filename)
+                    if file_path:
+                        saved_files.append(file_path)
                         
                 except Exception as e:
                     logger.error(f"Full page screenshot failed: {e}")
@@ -375,9 +564,9 @@ class LocalUSPSAutomator:
                 except Exception as e:
                     logger.warning(f"Error stopping Nova Act: {e}")
             
-            # Save logs to local directory (if enabled)
-            save_logs = os.environ.get('SAVE_LOGS', 'true').lower() == 'true'
-            if save_logs:
+            # Save logs to local directory (if enabled). This must follow stop(),
+            # which writes session_summary.json into the logs directory
+            if self._save_logs:
                 try:
                     logger.info("Saving Nova Act logs to local directory...")
                     saved_logs = self._save_logs_to_file()
@@ -421,6 +610,7 @@ def main():
         logger.error("export OUTPUT_DIR='mail_images'  # Default output directory")
         logger.error("export SAVE_LOGS='true'  # Save Nova Act logs")
         logger.error("export FILTER_ADDRESS_IMAGES='true'  # Filter images with addresses only")
+        logger.error("export REUSE_SESSION='false'  # Save USPS cookies to OUTPUT_DIR/.usps_state.json and reuse them")
         return
     
     if not nova_act_api_key:
@@ -459,7 +649,6 @@ def main():
         
     except Exception as e:
         logger.error(f"Local execution failed: {str(e)}")
-        import traceback
         logger.error(f"Full traceback: {traceback.format_exc()}")
 
 